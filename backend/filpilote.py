@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
+import threading
+import time
+from collections import deque
 from cleep.exception import CommandError
 from cleep.core import CleepRenderer
 from cleep.common import CATEGORIES, RENDERERS
 from cleep.profiles.thermostatprofile import ThermostatProfile
+from cleep.libs.internals.task import Task
+from .virtualpinbank import VirtualPinBank
+from .thermalmodel import fit_thermal_models, get_preheat_duration
 
 
 class Filpilote(CleepRenderer):
@@ -29,7 +36,30 @@ class Filpilote(CleepRenderer):
     MODULE_LABEL = "Fil-pilote"
 
     MODULE_CONFIG_FILE = "filpilote.conf"
-    DEFAULT_CONFIG = {}
+    DEFAULT_CONFIG = {
+        "simulation": {
+            "enabled": False,
+            "latency": 0.0,
+            "jitter": 0.0,
+            "faultrate": 0.0,
+            "timescale": 1.0,
+        },
+        "refreshinterval": 0,
+    }
+
+    # refresh task tick (seconds). Areas refreshes are spread over refresh interval
+    REFRESH_TICK = 10
+
+    # thermal models refit interval (seconds)
+    THERMAL_FIT_INTERVAL = 3600
+    # preheat check interval (seconds)
+    PREHEAT_TICK = 60
+    # maximum preheat duration (seconds) to guard against inaccurate models
+    MAX_PREHEAT_DURATION = 6 * 3600
+    # number of temperature samples kept per area
+    MAX_TEMPERATURE_SAMPLES = 2000
+    # temperature samples older than this (seconds) are not used for preheat
+    MAX_TEMPERATURE_SAMPLE_AGE = 1800
 
     RENDERER_TYPE = RENDERERS.HOMEAUTOMATION
     RENDERER_PROFILES = [ThermostatProfile]
@@ -59,6 +89,23 @@ class Filpilote(CleepRenderer):
         },
     }
 
+    # profile value field and value to fil-pilote order. Add new profile mapping here and
+    # register profile in RENDERER_PROFILES. Presence and heater on/off profiles are not
+    # provided by cleep core yet, their mappings will be added with them
+    RENDER_MAPPINGS = {
+        "ThermostatProfile": {
+            "field": "mode",
+            "orders": {
+                ThermostatProfile.MODE_STOP: MODE_STOP,
+                ThermostatProfile.MODE_ECO: MODE_ECO,
+                ThermostatProfile.MODE_ANTIFROST: MODE_ANTIFROST,
+                ThermostatProfile.MODE_COMFORT1: MODE_COMFORT,
+                ThermostatProfile.MODE_COMFORT2: MODE_COMFORT,
+                ThermostatProfile.MODE_COMFORT3: MODE_COMFORT,
+            },
+        },
+    }
+
     def __init__(self, bootstrap, debug_enabled):
         """
         Constructor
@@ -69,34 +116,639 @@ class Filpilote(CleepRenderer):
         """
         CleepRenderer.__init__(self, bootstrap, debug_enabled)
 
+        # compile render mappings once: (profile name, value key) => order
+        self.__render_fields = {
+            profile_name: mapping["field"]
+            for profile_name, mapping in self.RENDER_MAPPINGS.items()
+        }
+        self.__render_orders = {
+            (profile_name, self.__get_render_key(value)): order
+            for profile_name, mapping in self.RENDER_MAPPINGS.items()
+            for value, order in mapping["orders"].items()
+        }
+        self.__render_stats = {
+            "rendered": 0,
+            "rejected": 0,
+        }
+        self.__pin_bank = None
+        self.__refresh_task = None
+        self.__refresh_cursor = 0
+        self.__refresh_credit = 0
+        # last time area mode was applied on gpios (set_mode or refresh)
+        self.__last_applies = {}
+        # per area locks protecting mode update and gpios apply (set_mode, refresh and
+        # preheat tasks)
+        self.__area_locks = {}
+        self.__temperature_samples = {}
+        self.__thermal_models = {}
+        self.__thermal_fit_task = None
+        self.__preheat_task = None
+
+    def _configure(self):
+        """
+        Configure application
+        """
+        self.__configure_simulation(self._get_config_field("simulation"))
+
+        # restore thermal models fitted before restart
+        self.__thermal_models = {
+            area["uuid"]: area["thermal_model"]
+            for area in self._get_devices().values()
+            if area.get("thermal_model")
+        }
+
+    def _on_start(self):
+        """
+        Application is started
+        """
+        self.__start_refresh_task(self._get_config_field("refreshinterval"))
+
+        self.__thermal_fit_task = Task(
+            self.THERMAL_FIT_INTERVAL, self.__fit_thermal_models, self.logger
+        )
+        self.__thermal_fit_task.start()
+        self.__preheat_task = Task(
+            self.PREHEAT_TICK, self.__check_preheats, self.logger
+        )
+        self.__preheat_task.start()
+
+    def _on_stop(self):
+        """
+        Application is stopped
+        """
+        self.__stop_refresh_task()
+        if self.__thermal_fit_task:
+            self.__thermal_fit_task.stop()
+        if self.__preheat_task:
+            self.__preheat_task.stop()
+
+    def on_event(self, event):
+        """
+        Event received
+
+        Args:
+            event (MessageRequest): event data
+        """
+        if event["event"] == "sensors.temperature.update":
+            self.__add_temperature_sample(event["device_id"], event["params"])
+
+    def __add_temperature_sample(self, sensor_uuid, params):
+        """
+        Store temperature sample for areas tied to specified sensor
+
+        Args:
+            sensor_uuid (str): temperature sensor uuid
+            params (dict): temperature event params
+        """
+        timestamp = params.get("timestamp")
+        if timestamp is None:
+            timestamp = time.time()
+        for area in self._get_devices().values():
+            if area.get("sensor_uuid") != sensor_uuid:
+                continue
+            samples = self.__temperature_samples.setdefault(
+                area["uuid"], deque(maxlen=self.MAX_TEMPERATURE_SAMPLES)
+            )
+            samples.append((timestamp, params["celsius"], area["mode"]))
+
+    def __fit_thermal_models(self):
+        """
+        Refit thermal models of all areas from sampled temperatures. It runs in its own
+        task and works on samples snapshot so it never delays mode changes. Fitted models
+        are saved in areas to be available after restart
+        """
+        samples = {
+            area_uuid: list(area_samples)
+            for area_uuid, area_samples in list(self.__temperature_samples.items())
+        }
+        if not samples:
+            return
+
+        start = time.perf_counter()
+        fitted_models = fit_thermal_models(samples, self.MODE_COMFORT, self.MODE_ECO)
+        self.logger.debug(
+            "Thermal models of %s areas fitted in %.3f seconds",
+            len(samples),
+            time.perf_counter() - start,
+        )
+
+        models = dict(self.__thermal_models)
+        for area_uuid, model in fitted_models.items():
+            if model["heatrate"] is None and model["coolrate"] is None:
+                # not enough samples, keep previous model
+                continue
+            with self.__get_area_lock(area_uuid):
+                if not self._get_device(area_uuid):
+                    continue
+                self._update_device(area_uuid, {"thermal_model": model})
+            models[area_uuid] = model
+        self.__thermal_models = models
+
+    def __check_preheats(self):
+        """
+        Switch areas to COMFORT mode early enough to reach comfort temperature at
+        scheduled time
+        """
+        now = time.time()
+        for area_uuid in list(self._get_devices().keys()):
+            with self.__get_area_lock(area_uuid):
+                self.__check_preheat(area_uuid, now)
+
+    def __check_preheat(self, area_uuid, now):
+        """
+        Switch specified area to COMFORT mode if its preheat must start
+
+        Args:
+            area_uuid (str): area uuid
+            now (float): current timestamp
+        """
+        # re-read area to use mode and preheat set meanwhile
+        area = self._get_device(area_uuid)
+        if not area or not area.get("preheat"):
+            return
+        preheat = area["preheat"]
+
+        if now - preheat["time"] > self.PREHEAT_TICK:
+            # comfort time passed (application was stopped), preheat is useless now
+            self.logger.warning(
+                'Preheat of area "%s" expired, it is dropped', area["name"]
+            )
+            self._update_device(area_uuid, {"preheat": None})
+            return
+
+        duration = self.__get_preheat_duration(area, preheat, now)
+        if now < preheat["time"] - (duration or 0):
+            return
+
+        if duration is None:
+            self.logger.info(
+                'Preheat area "%s" without lead time (no recent temperature or thermal model)',
+                area["name"],
+            )
+        else:
+            self.logger.info(
+                'Preheat area "%s" (%d seconds before comfort time)',
+                area["name"],
+                max(preheat["time"] - now, 0),
+            )
+        self._update_device(area_uuid, {"preheat": None})
+        if area["mode"] != self.MODE_COMFORT:
+            self.set_mode(area_uuid, self.MODE_COMFORT)
+
+    def __get_preheat_duration(self, area, preheat, now):
+        """
+        Return duration needed to reach preheat temperature
+
+        Args:
+            area (dict): area
+            preheat (dict): area preheat
+            now (float): current timestamp
+
+        Returns:
+            float: preheat duration in seconds
+            None: if duration can't be predicted (no recent temperature or no model)
+        """
+        samples = self.__temperature_samples.get(area["uuid"])
+        if not samples or now - samples[-1][0] > self.MAX_TEMPERATURE_SAMPLE_AGE:
+            return None
+
+        # area cools down until preheat starts when it is in ECO mode
+        time_to_target = preheat["time"] - now if area["mode"] == self.MODE_ECO else 0
+        duration = get_preheat_duration(
+            self.__thermal_models.get(area["uuid"]),
+            samples[-1][1],
+            preheat["temperature"],
+            max(time_to_target, 0),
+        )
+        return None if duration is None else min(duration, self.MAX_PREHEAT_DURATION)
+
+    def set_area_sensor(self, area_uuid, sensor_uuid=None):
+        """
+        Tie temperature sensor to area. Sensor temperatures are used to learn area thermal
+        model for preheat
+
+        Args:
+            area_uuid (str): area uuid
+            sensor_uuid (str): temperature sensor uuid (None to untie sensor)
+
+        Returns:
+            bool: True if sensor tied successfully
+        """
+        self._check_parameters(
+            [
+                {
+                    "name": "area_uuid",
+                    "value": area_uuid,
+                    "type": str,
+                    "validator": lambda uuid: self._get_device(uuid) is not None,
+                    "message": "Specified area does not exist",
+                },
+                {
+                    "name": "sensor_uuid",
+                    "value": sensor_uuid,
+                    "type": str,
+                    "none": True,
+                },
+            ]
+        )
+
+        area = self._get_device(area_uuid)
+        if not self._update_device(area["uuid"], {"sensor_uuid": sensor_uuid}):
+            raise CommandError(f'Unable to set sensor for {area["name"]}')
+        self.__temperature_samples.pop(area["uuid"], None)
+
+        return True
+
+    def set_preheat(self, area_uuid, comfort_time, comfort_temperature):
+        """
+        Schedule area preheat: area switches to COMFORT mode early enough to reach comfort
+        temperature at specified time (according to area thermal model)
+
+        Args:
+            area_uuid (str): area uuid
+            comfort_time (int): timestamp when comfort temperature must be reached
+            comfort_temperature (float): comfort temperature in celsius
+
+        Returns:
+            bool: True if preheat scheduled successfully
+        """
+        self._check_parameters(
+            [
+                {
+                    "name": "area_uuid",
+                    "value": area_uuid,
+                    "type": str,
+                    "validator": lambda uuid: self._get_device(uuid) is not None,
+                    "message": "Specified area does not exist",
+                },
+                {
+                    "name": "comfort_time",
+                    "value": comfort_time,
+                    "type": int,
+                    "validator": lambda val: val > time.time(),
+                    "message": "Comfort time must be in the future",
+                },
+                {
+                    "name": "comfort_temperature",
+                    "value": comfort_temperature,
+                    "type": float,
+                },
+            ]
+        )
+
+        area = self._get_device(area_uuid)
+        preheat = {
+            "time": comfort_time,
+            "temperature": comfort_temperature,
+        }
+        if not self._update_device(area["uuid"], {"preheat": preheat}):
+            raise CommandError(f'Unable to set preheat for {area["name"]}')
+
+        return True
+
+    def get_thermal_models(self):
+        """
+        Return areas thermal models
+
+        Returns:
+            dict: thermal models indexed by area uuid::
+
+            {
+                area_uuid (str): {
+                    heatrate (float): heating rate in celsius per hour
+                    coolrate (float): cooling rate in celsius per hour
+                    error (float): prediction root mean square error in celsius
+                    fitduration (float): fit duration in seconds
+                    fittime (float): fit timestamp
+                },
+                ...
+            }
+
+        """
+        return dict(self.__thermal_models)
+
+    def __start_refresh_task(self, refresh_interval):
+        """
+        Start refresh task if refresh is enabled
+
+        Args:
+            refresh_interval (int): refresh interval in seconds (0 disables refresh)
+        """
+        self.__stop_refresh_task()
+        self.__refresh_credit = 0
+        if not refresh_interval:
+            return
+
+        self.__refresh_task = Task(
+            self.REFRESH_TICK,
+            self.__refresh_areas,
+            self.logger,
+            task_args=[refresh_interval],
+        )
+        self.__refresh_task.start()
+
+    def __stop_refresh_task(self):
+        """
+        Stop refresh task
+        """
+        if self.__refresh_task:
+            self.__refresh_task.stop()
+            self.__refresh_task = None
+
+    def __get_area_lock(self, area_uuid):
+        """
+        Return lock of specified area
+
+        Args:
+            area_uuid (str): area uuid
+
+        Returns:
+            threading.RLock: area lock
+        """
+        return self.__area_locks.setdefault(area_uuid, threading.RLock())
+
+    def __refresh_areas(self, refresh_interval):
+        """
+        Re-apply mode of next areas. Each tick earns a credit of areas refreshes so all
+        areas are refreshed once per refresh interval without burst on gpios
+
+        Args:
+            refresh_interval (int): refresh interval in seconds
+        """
+        areas = sorted(self._get_devices().values(), key=lambda area: area["uuid"])
+        if not areas:
+            return
+
+        # credit is counted in seconds, one area refresh costs refresh interval. Keep
+        # at most one tick of unused credit to avoid burst after idle ticks
+        tick_credit = len(areas) * self.REFRESH_TICK
+        self.__refresh_credit = min(
+            self.__refresh_credit + tick_credit, tick_credit + refresh_interval
+        )
+        now = time.monotonic()
+        for _ in range(len(areas)):
+            if self.__refresh_credit < refresh_interval:
+                break
+            self.__refresh_cursor = self.__refresh_cursor % len(areas)
+            area_uuid = areas[self.__refresh_cursor]["uuid"]
+            self.__refresh_cursor += 1
+            if self.__refresh_area(area_uuid, refresh_interval, now):
+                self.__refresh_credit -= refresh_interval
+
+    def __refresh_area(self, area_uuid, refresh_interval, now):
+        """
+        Re-apply current mode of specified area
+
+        Args:
+            area_uuid (str): area uuid
+            refresh_interval (int): refresh interval in seconds
+            now (float): refresh time (monotonic)
+
+        Returns:
+            bool: True if area was refreshed
+        """
+        with self.__get_area_lock(area_uuid):
+            # re-read area to apply mode set meanwhile
+            area = self._get_device(area_uuid)
+            if not area:
+                return False
+
+            last_apply = self.__last_applies.get(area_uuid)
+            if last_apply is not None and now - last_apply < refresh_interval:
+                # mode applied recently, no need to refresh it
+                return False
+
+            self.logger.debug('Refresh mode of area "%s"', area["name"])
+            self.__last_applies[area_uuid] = now
+            self.__apply_mode(area["mode"], area)
+            return True
+
+    def set_refresh_interval(self, refresh_interval):
+        """
+        Set interval to periodically re-apply areas mode
+
+        Args:
+            refresh_interval (int): refresh interval in seconds (0 disables refresh)
+
+        Returns:
+            bool: True if refresh interval saved successfully
+        """
+        self._check_parameters(
+            [
+                {
+                    "name": "refresh_interval",
+                    "value": refresh_interval,
+                    "type": int,
+                    "validator": lambda val: val == 0 or val >= self.REFRESH_TICK,
+                    "message": f"Refresh interval must be 0 or at least {self.REFRESH_TICK} seconds",
+                },
+            ]
+        )
+
+        if not self._set_config_field("refreshinterval", refresh_interval):
+            raise CommandError("Unable to save refresh interval")
+        self.__start_refresh_task(refresh_interval)
+
+        return True
+
+    def __configure_simulation(self, simulation):
+        """
+        Enable or disable hardware simulation. Virtual pin bank is kept while simulation
+        is enabled, only its parameters are updated
+
+        Args:
+            simulation (dict): simulation config
+        """
+        if not simulation["enabled"]:
+            self.__pin_bank = None
+            self.__purge_simulated_areas()
+            return
+
+        if self.__pin_bank:
+            self.__pin_bank.configure(
+                simulation["latency"],
+                simulation["jitter"],
+                simulation["faultrate"],
+                simulation["timescale"],
+            )
+            return
+
+        self.logger.info("Hardware simulation enabled, gpios app is not used")
+        self.__pin_bank = VirtualPinBank(
+            latency=simulation["latency"],
+            jitter=simulation["jitter"],
+            fault_rate=simulation["faultrate"],
+            time_scale=simulation["timescale"],
+        )
+
+        # restore existing areas gpios
+        for area in self._get_devices().values():
+            self.__pin_bank.restore_gpio(area["gpio1"])
+            self.__pin_bank.restore_gpio(area["gpio2"])
+
+    def __purge_simulated_areas(self):
+        """
+        Delete areas created during simulation, their gpios only exist in virtual pin bank
+        """
+        for area in list(self._get_devices().values()):
+            if not area.get("simulated"):
+                continue
+            self.logger.info('Delete simulated area "%s"', area["name"])
+            self.__last_applies.pop(area["uuid"], None)
+            self.__temperature_samples.pop(area["uuid"], None)
+            self.__thermal_models.pop(area["uuid"], None)
+            self._delete_device(area["uuid"])
+
+    @staticmethod
+    def __get_render_key(value):
+        """
+        Return render mapping key for specified profile value. Keys are strings to be
+        stored as is in area (json) config
+
+        Args:
+            value (any): profile value
+
+        Returns:
+            str: render key
+            None: if value can't be used as render key
+        """
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (bool, int)):
+            return json.dumps(value)
+        return None
+
     def on_render(self, profile_name, profile_values):
         """
         Renderer received profile
 
         Args:
             profile_name (str): rendered profile name
+            profile_values (dict|list): profile values or list of profile values to render
+                                        several devices at once
+        """
+        field = self.__render_fields.get(profile_name)
+        if field is None:
+            self.__render_stats["rejected"] += 1
+            return
+
+        batch = profile_values if isinstance(profile_values, list) else [profile_values]
+        for values in batch:
+            self.__render_profile_values(profile_name, field, values)
+
+    def __render_profile_values(self, profile_name, field, profile_values):
+        """
+        Render single profile values
+
+        Args:
+            profile_name (str): rendered profile name
+            field (str): profile values field holding value to render
             profile_values (dict): profile values
         """
-        if profile_name == "ThermostatProfile":
-            device = self._get_device(profile_values["device_uuid"])
-            if not device:
-                # device is surely not handled by this application
-                return
-
-            if profile_values["mode"] == ThermostatProfile.MODE_STOP:
-                mode = self.MODE_STOP
-            elif profile_values["mode"] == ThermostatProfile.MODE_ECO:
-                mode = self.MODE_ECO
-            elif profile_values["mode"] == ThermostatProfile.MODE_ANTIFROST:
-                mode = self.MODE_ANTIFROST
-            elif profile_values["mode"] in [
-                ThermostatProfile.MODE_COMFORT1,
-                ThermostatProfile.MODE_COMFORT2,
-                ThermostatProfile.MODE_COMFORT3,
-            ]:
-                mode = self.MODE_COMFORT
-
-            self.set_mode(device["uuid"], mode)
+        render_key = self.__get_render_key(profile_values.get(field))
+        if render_key is None:
+            self.__render_stats["rejected"] += 1
+            return
+
+        device = self._get_device(profile_values.get("device_uuid"))
+        if not device:
+            # device is surely not handled by this application
+            return
+
+        area_orders = device.get("render_mappings", {}).get(profile_name, {})
+        mode = area_orders.get(render_key) or self.__render_orders.get(
+            (profile_name, render_key)
+        )
+        if mode is None:
+            self.logger.debug(
+                'Unhandled value "%s" for profile "%s"', render_key, profile_name
+            )
+            self.__render_stats["rejected"] += 1
+            return
+
+        self.__render_stats["rendered"] += 1
+        self.set_mode(device["uuid"], mode)
+
+    def get_render_stats(self):
+        """
+        Return render statistics
+
+        Returns:
+            dict: render statistics::
+
+            {
+                rendered (int): number of rendered profile values
+                rejected (int): number of rejected profile values (unknown profile or value)
+            }
+
+        """
+        return dict(self.__render_stats)
+
+    def set_render_mapping(self, area_uuid, profile_name, mapping):
+        """
+        Override render mapping of specified profile for an area
+
+        Args:
+            area_uuid (str): area uuid
+            profile_name (str): profile name (ThermostatProfile)
+            mapping (dict): profile value to mode mapping ({"eco": "STOP"}). Empty dict
+                            restores default mapping
+
+        Returns:
+            bool: True if mapping saved successfully
+        """
+        self._check_parameters(
+            [
+                {
+                    "name": "area_uuid",
+                    "value": area_uuid,
+                    "type": str,
+                    "validator": lambda uuid: self._get_device(uuid) is not None,
+                    "message": "Specified area does not exist",
+                },
+                {
+                    "name": "profile_name",
+                    "value": profile_name,
+                    "type": str,
+                    "validator": lambda val: val in self.__render_fields,
+                    "message": "Specified profile is not supported",
+                },
+                {
+                    "name": "mapping",
+                    "value": mapping,
+                    "type": dict,
+                    "validator": lambda val: all(
+                        mode in self.MODES for mode in val.values()
+                    ),
+                    "message": "Mapping contains invalid mode",
+                },
+                {
+                    "name": "mapping",
+                    "value": mapping,
+                    "type": dict,
+                    "validator": lambda val: all(
+                        (profile_name, self.__get_render_key(value))
+                        in self.__render_orders
+                        for value in val.keys()
+                    ),
+                    "message": "Mapping contains unknown profile value",
+                },
+            ]
+        )
+
+        area = self._get_device(area_uuid)
+        render_mappings = dict(area.get("render_mappings", {}))
+        if mapping:
+            render_mappings[profile_name] = {
+                self.__get_render_key(value): mode for value, mode in mapping.items()
+            }
+        else:
+            render_mappings.pop(profile_name, None)
+
+        if not self._update_device(area["uuid"], {"render_mappings": render_mappings}):
+            raise CommandError(f'Unable to save render mapping for {area["name"]}')
+
+        return True
 
     def __get_area_by_name(self, area_name):
         """
@@ -151,6 +803,9 @@ class Filpilote(CleepRenderer):
             "name": area_name,
             "mode": self.MODE_STOP,
         }
+        if self.__pin_bank:
+            # area only exists during simulation
+            area["simulated"] = True
 
         # save gpios
         gpio1_data = self.__save_gpio_in_gpios(area_name, gpio1, 1, area)
@@ -196,6 +851,10 @@ class Filpilote(CleepRenderer):
         self.__delete_gpio_in_gpios(area["gpio2"], 2)
 
         # delete area
+        self.__last_applies.pop(area["uuid"], None)
+        self.__area_locks.pop(area["uuid"], None)
+        self.__temperature_samples.pop(area["uuid"], None)
+        self.__thermal_models.pop(area["uuid"], None)
         if not self._delete_device(area["uuid"]):
             raise CommandError("Unable to delete area")
 
@@ -231,15 +890,17 @@ class Filpilote(CleepRenderer):
             ]
         )
 
-        area = self._get_device(area_uuid)
-        previous_mode = area["mode"]
-        if not self._update_device(area["uuid"], {"mode": mode}):
-            raise CommandError(f'Unable to set mode {mode} for {area["name"]}')
+        with self.__get_area_lock(area_uuid):
+            area = self._get_device(area_uuid)
+            previous_mode = area["mode"]
+            if not self._update_device(area["uuid"], {"mode": mode}):
+                raise CommandError(f'Unable to set mode {mode} for {area["name"]}')
 
-        if not self.__apply_mode(mode, area):
-            self._update_device(area["uuid"], {"mode": previous_mode})
-            return False
-        return True
+            if not self.__apply_mode(mode, area):
+                self._update_device(area["uuid"], {"mode": previous_mode})
+                return False
+            self.__last_applies[area["uuid"]] = time.monotonic()
+            return True
 
     def __apply_mode(self, mode, area):
         """
@@ -256,7 +917,7 @@ class Filpilote(CleepRenderer):
 
         gpio_command = "turn_on" if mode_config["gpio1"] else "turn_off"
         gpio_uuid = area["gpio1"]["uuid"]
-        resp1 = self.send_command(gpio_command, "gpios", {"device_uuid": gpio_uuid})
+        resp1 = self.__send_gpios_command(gpio_command, {"device_uuid": gpio_uuid})
         if resp1.error:
             self.logger.error(
                 'Error executing "%s" command for gpio1 "%s" from area "%s"',
@@ -268,7 +929,7 @@ class Filpilote(CleepRenderer):
 
         gpio_command = "turn_on" if mode_config["gpio2"] else "turn_off"
         gpio_uuid = area["gpio2"]["uuid"]
-        resp2 = self.send_command(gpio_command, "gpios", {"device_uuid": gpio_uuid})
+        resp2 = self.__send_gpios_command(gpio_command, {"device_uuid": gpio_uuid})
         if resp2.error:
             self.logger.error(
                 'Error executing "%s" command for gpio1 "%s" from area "%s"',
@@ -281,6 +942,101 @@ class Filpilote(CleepRenderer):
         self.logger.info('Mode "%s" applying for area "%s"', mode, area["name"])
         return True
 
+    def __send_gpios_command(self, command, params):
+        """
+        Send command to gpios app, or to virtual pin bank if simulation is enabled
+
+        Args:
+            command (str): gpios command
+            params (dict): command parameters
+
+        Returns:
+            MessageResponse: command response
+        """
+        if self.__pin_bank:
+            return self.__pin_bank.execute(command, params)
+        return self.send_command(command, "gpios", params)
+
+    def set_simulation(
+        self, enabled, latency=0.0, jitter=0.0, fault_rate=0.0, time_scale=1.0
+    ):
+        """
+        Configure hardware simulation. When enabled, gpios app is replaced by an in-process
+        virtual pin bank that mirrors existing areas gpios. Areas created during simulation
+        are deleted when simulation is disabled.
+
+        Args:
+            enabled (bool): True to enable simulation
+            latency (float): simulated command latency in seconds
+            jitter (float): simulated maximum random latency in seconds
+            fault_rate (float): simulated command failure probability (0..1)
+            time_scale (float): simulation speed factor
+
+        Returns:
+            bool: True if simulation configured successfully
+        """
+        self._check_parameters(
+            [
+                {
+                    "name": "enabled",
+                    "value": enabled,
+                    "type": bool,
+                },
+                {
+                    "name": "latency",
+                    "value": latency,
+                    "type": float,
+                    "validator": lambda val: val >= 0,
+                    "message": "Latency must be positive",
+                },
+                {
+                    "name": "jitter",
+                    "value": jitter,
+                    "type": float,
+                    "validator": lambda val: val >= 0,
+                    "message": "Jitter must be positive",
+                },
+                {
+                    "name": "fault_rate",
+                    "value": fault_rate,
+                    "type": float,
+                    "validator": lambda val: 0 <= val <= 1,
+                    "message": "Fault rate must be between 0 and 1",
+                },
+                {
+                    "name": "time_scale",
+                    "value": time_scale,
+                    "type": float,
+                    "validator": lambda val: val > 0,
+                    "message": "Time scale must be greater than 0",
+                },
+            ]
+        )
+
+        simulation = {
+            "enabled": enabled,
+            "latency": latency,
+            "jitter": jitter,
+            "faultrate": fault_rate,
+            "timescale": time_scale,
+        }
+        if not self._set_config_field("simulation", simulation):
+            raise CommandError("Unable to save simulation config")
+        self.__configure_simulation(simulation)
+
+        return True
+
+    def get_simulation_transitions(self):
+        """
+        Return pin transitions recorded by hardware simulation
+
+        Returns:
+            list: list of transitions (see VirtualPinBank.get_transitions)
+        """
+        if not self.__pin_bank:
+            raise CommandError("Hardware simulation is not enabled")
+        return self.__pin_bank.get_transitions()
+
     def __save_gpio_in_gpios(self, area_name, gpio, gpio_index, area):
         """
         Save gpio in gpios app
@@ -299,7 +1055,7 @@ class Filpilote(CleepRenderer):
             "inverted": False,
         }
 
-        resp = self.send_command("add_gpio", "gpios", data)
+        resp = self.__send_gpios_command("add_gpio", data)
         if resp.error:
             self.logger.error(f"Unable to add gpio{gpio_index}: {resp.message}")
             if "gpio1" in area:
@@ -319,7 +1075,7 @@ class Filpilote(CleepRenderer):
         Returns:
             bool: True if gpio deleted successfully
         """
-        resp = self.send_command("delete_gpio", "gpios", {"device_uuid": gpio["uuid"]})
+        resp = self.__send_gpios_command("delete_gpio", {"device_uuid": gpio["uuid"]})
         if resp.error:
             self.logger.warning(
                 'Error deleting gpio%s "%s" on gpios app', gpio_index, gpio["uuid"]
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import time
+
+
+def fit_thermal_models(samples, heat_mode, cool_mode):
+    """
+    Fit thermal models of all areas in a single batch.
+
+    Each model is a linear temperature rate (celsius per hour) while area is heating
+    (heat_mode) and cooling (cool_mode). Rates are least squares slopes pooled over all
+    contiguous sample segments in the same mode.
+
+    Args:
+        samples (dict): area samples indexed by area uuid::
+
+            {
+                area_uuid (str): [(timestamp (float), celsius (float), mode (str)), ...],
+                ...
+            }
+
+        heat_mode (str): mode that heats area
+        cool_mode (str): mode that cools area
+
+    Returns:
+        dict: thermal models indexed by area uuid::
+
+        {
+            area_uuid (str): {
+                heatrate (float): heating rate in celsius per hour (None if not fitted)
+                coolrate (float): cooling rate in celsius per hour (None if not fitted)
+                error (float): root mean square error in celsius of temperatures predicted
+                               from segments start (None if not fitted)
+                fitduration (float): fit duration in seconds
+                fittime (float): fit timestamp
+            },
+            ...
+        }
+
+    """
+    models = {}
+    for area_uuid, area_samples in samples.items():
+        start = time.perf_counter()
+        model = fit_thermal_model(area_samples, heat_mode, cool_mode)
+        model.update(
+            {
+                "fitduration": time.perf_counter() - start,
+                "fittime": time.time(),
+            }
+        )
+        models[area_uuid] = model
+
+    return models
+
+
+def fit_thermal_model(samples, heat_mode, cool_mode):
+    """
+    Fit thermal model of a single area
+
+    Args:
+        samples (list): list of (timestamp, celsius, mode) ordered by timestamp
+        heat_mode (str): mode that heats area
+        cool_mode (str): mode that cools area
+
+    Returns:
+        dict: thermal model (heatrate, coolrate and error)
+    """
+    segments = {heat_mode: [], cool_mode: []}
+    for segment in _split_segments(samples):
+        if segment[0][2] in segments and len(segment) > 1:
+            segments[segment[0][2]].append(segment)
+
+    rates = {mode: _fit_rate(mode_segments) for mode, mode_segments in segments.items()}
+
+    # prediction error: later samples of each segment are predicted from segment
+    # first sample, as preheat does from current temperature
+    squared_errors = 0.0
+    count = 0
+    for mode, mode_segments in segments.items():
+        if rates[mode] is None:
+            continue
+        rate = rates[mode] / 3600.0
+        for segment in mode_segments:
+            start_time, start_celsius, _ = segment[0]
+            for timestamp, celsius, _ in segment[1:]:
+                predicted = start_celsius + rate * (timestamp - start_time)
+                squared_errors += (celsius - predicted) ** 2
+                count += 1
+
+    return {
+        "heatrate": rates[heat_mode],
+        "coolrate": rates[cool_mode],
+        "error": math.sqrt(squared_errors / count) if count else None,
+    }
+
+
+def get_preheat_duration(model, current_celsius, target_celsius, time_to_target=0.0):
+    """
+    Return duration needed to reach target temperature while heating. Until heating
+    starts, area is assumed to cool down at model cooling rate (area in cooling mode)
+
+    Args:
+        model (dict): area thermal model
+        current_celsius (float): current area temperature
+        target_celsius (float): temperature to reach
+        time_to_target (float): seconds until target must be reached while area is
+                                cooling (0 if area is not cooling)
+
+    Returns:
+        float: duration in seconds (0 if target is reached without heating)
+        None: if model can't predict duration
+    """
+    cool_rate = 0.0
+    if time_to_target > 0 and model and model["coolrate"] and model["coolrate"] < 0:
+        cool_rate = model["coolrate"] / 3600.0
+
+    # temperature to gain if heating started at target time
+    needed_celsius = target_celsius - current_celsius - cool_rate * time_to_target
+    if needed_celsius <= 0:
+        return 0.0
+    if not model or not model["heatrate"] or model["heatrate"] <= 0:
+        return None
+
+    # heating starts earlier so area cools less: solve
+    # duration * heat_rate = target - (current + cool_rate * (time_to_target - duration))
+    heat_rate = model["heatrate"] / 3600.0
+    duration = needed_celsius / (heat_rate - cool_rate)
+    if duration >= time_to_target:
+        # heating must start now, area won't cool anymore
+        duration = (target_celsius - current_celsius) / heat_rate
+    return duration
+
+
+def _split_segments(samples):
+    """
+    Split samples in contiguous segments of same mode
+
+    Args:
+        samples (list): list of (timestamp, celsius, mode)
+
+    Returns:
+        list: list of segments
+    """
+    segments = []
+    for sample in samples:
+        if segments and segments[-1][-1][2] == sample[2]:
+            segments[-1].append(sample)
+        else:
+            segments.append([sample])
+    return segments
+
+
+def _get_means(segment):
+    """
+    Return segment mean timestamp and mean temperature
+
+    Args:
+        segment (list): list of (timestamp, celsius, mode)
+
+    Returns:
+        tuple: mean timestamp and mean temperature
+    """
+    return (
+        sum(sample[0] for sample in segment) / len(segment),
+        sum(sample[1] for sample in segment) / len(segment),
+    )
+
+
+def _fit_rate(segments):
+    """
+    Fit temperature rate pooled over segments (each segment has its own intercept)
+
+    Args:
+        segments (list): list of segments
+
+    Returns:
+        float: temperature rate in celsius per hour
+        None: if rate can't be fitted
+    """
+    sxy = 0.0
+    sxx = 0.0
+    for segment in segments:
+        mean_time, mean_celsius = _get_means(segment)
+        for timestamp, celsius, _ in segment:
+            sxy += (timestamp - mean_time) * (celsius - mean_celsius)
+            sxx += (timestamp - mean_time) ** 2
+
+    return sxy / sxx * 3600.0 if sxx else None
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from cleep.common import MessageResponse
+
+
+class VirtualPinBank:
+    """
+    In-process virtual pin bank that mimics gpios app commands used by filpilote.
+    It allows running the application without Raspberry pi hardware.
+    """
+
+    MAX_TRANSITIONS = 100000
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        fault_rate=0.0,
+        time_scale=1.0,
+        max_transitions=MAX_TRANSITIONS,
+        start_time=0.0,
+        rand=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """
+        Constructor
+
+        Args:
+            latency (float): command latency in seconds
+            jitter (float): maximum random latency added to each command in seconds
+            fault_rate (float): probability (0..1) of a command failure
+            time_scale (float): simulation speed factor (10.0 runs 10 times faster)
+            max_transitions (int): number of recorded transitions to keep
+            start_time (float): simulated time when bank is created
+            rand (random.Random): random generator (to get reproducible runs)
+            clock (function): wall clock function used to compute simulated time
+            sleep (function): sleep function used to simulate latency
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.time_scale = time_scale
+        self.__rand = rand or random.Random()
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__lock = threading.Lock()
+        self.__clock_origin = clock()
+        self.__simulated_origin = start_time
+        self.__pins = {}
+        self.__transitions = deque(maxlen=max_transitions)
+        self.__commands = {
+            "add_gpio": self.add_gpio,
+            "delete_gpio": self.delete_gpio,
+            "turn_on": self.turn_on,
+            "turn_off": self.turn_off,
+        }
+
+    def configure(self, latency, jitter, fault_rate, time_scale):
+        """
+        Update simulation parameters keeping virtual gpios and recorded transitions
+
+        Args:
+            latency (float): command latency in seconds
+            jitter (float): maximum random latency added to each command in seconds
+            fault_rate (float): probability (0..1) of a command failure
+            time_scale (float): simulation speed factor
+        """
+        with self.__lock:
+            # rebase simulated time so time scale change only applies from now
+            now = self.__clock()
+            self.__simulated_origin = self.__get_simulated_time(now)
+            self.__clock_origin = now
+            self.latency = latency
+            self.jitter = jitter
+            self.fault_rate = fault_rate
+            self.time_scale = time_scale
+
+    def __get_simulated_time(self, now):
+        """
+        Return simulated time
+
+        Args:
+            now (float): wall clock time
+
+        Returns:
+            float: simulated time
+        """
+        return self.__simulated_origin + (now - self.__clock_origin) * self.time_scale
+
+    def execute(self, command, params):
+        """
+        Execute gpios command on virtual pin bank
+
+        Args:
+            command (str): gpios command name
+            params (dict): command parameters
+
+        Returns:
+            MessageResponse: command response as gpios app would return
+        """
+        handler = self.__commands.get(command)
+        if handler is None:
+            return MessageResponse(error=True, message=f'Unknown command "{command}"')
+
+        self.__wait()
+        if self.fault_rate and self.__rand.random() < self.fault_rate:
+            return MessageResponse(
+                error=True, message=f'Simulated fault on "{command}" command'
+            )
+
+        try:
+            return MessageResponse(data=handler(**params))
+        except Exception as error:
+            return MessageResponse(error=True, message=str(error))
+
+    def __wait(self):
+        """
+        Simulate command latency
+        """
+        delay = self.latency + (
+            self.__rand.uniform(0, self.jitter) if self.jitter else 0
+        )
+        if delay > 0:
+            self.__sleep(delay / self.time_scale)
+
+    def add_gpio(self, name, gpio, mode, keep, inverted):
+        """
+        Add virtual gpio
+
+        Args:
+            name (str): gpio name
+            gpio (str): gpio (GPIOX)
+            mode (str): gpio mode
+            keep (bool): keep gpio state after reboot
+            inverted (bool): inverted gpio
+
+        Returns:
+            dict: virtual gpio
+        """
+        with self.__lock:
+            if any(pin["gpio"] == gpio for pin in self.__pins.values()):
+                raise Exception(f"Gpio {gpio} is already used")
+
+            pin = {
+                "uuid": str(uuid.uuid4()),
+                "name": name,
+                "gpio": gpio,
+                "mode": mode,
+                "keep": keep,
+                "inverted": inverted,
+                "type": "gpio",
+                "subtype": mode,
+                "on": False,
+            }
+            self.__pins[pin["uuid"]] = pin
+            return dict(pin)
+
+    def restore_gpio(self, gpio):
+        """
+        Restore virtual gpio previously returned by add_gpio (after application restart)
+
+        Args:
+            gpio (dict): gpio as returned by add_gpio
+        """
+        with self.__lock:
+            pin = dict(gpio)
+            pin.setdefault("on", False)
+            self.__pins[pin["uuid"]] = pin
+
+    def delete_gpio(self, device_uuid):
+        """
+        Delete virtual gpio
+
+        Args:
+            device_uuid (str): gpio uuid
+
+        Returns:
+            bool: True if gpio deleted
+        """
+        with self.__lock:
+            if self.__pins.pop(device_uuid, None) is None:
+                raise Exception(f"Gpio {device_uuid} does not exist")
+            return True
+
+    def turn_on(self, device_uuid):
+        """
+        Turn on virtual gpio
+
+        Args:
+            device_uuid (str): gpio uuid
+
+        Returns:
+            bool: True if gpio turned on
+        """
+        return self.__set_level(device_uuid, True)
+
+    def turn_off(self, device_uuid):
+        """
+        Turn off virtual gpio
+
+        Args:
+            device_uuid (str): gpio uuid
+
+        Returns:
+            bool: True if gpio turned off
+        """
+        return self.__set_level(device_uuid, False)
+
+    def __set_level(self, device_uuid, level):
+        """
+        Set virtual gpio level and record transition if level changed
+
+        Args:
+            device_uuid (str): gpio uuid
+            level (bool): new gpio level
+
+        Returns:
+            bool: True if level set
+        """
+        with self.__lock:
+            pin = self.__pins.get(device_uuid)
+            if pin is None:
+                raise Exception(f"Gpio {device_uuid} does not exist")
+            if pin["on"] == level:
+                # level unchanged, not a transition
+                return True
+            pin["on"] = level
+            now = self.__clock()
+            self.__transitions.append(
+                {
+                    "timestamp": self.__get_simulated_time(now),
+                    "clocktime": now,
+                    "uuid": device_uuid,
+                    "gpio": pin["gpio"],
+                    "on": level,
+                }
+            )
+            return True
+
+    def get_pins(self):
+        """
+        Return virtual gpios
+
+        Returns:
+            dict: virtual gpios indexed by uuid
+        """
+        with self.__lock:
+            return {pin_uuid: dict(pin) for pin_uuid, pin in self.__pins.items()}
+
+    def get_transitions(self):
+        """
+        Return recorded pin transitions
+
+        Returns:
+            list: list of transitions::
+
+            [
+                {
+                    timestamp (float): transition simulated time
+                    clocktime (float): transition wall clock time
+                    uuid (str): gpio uuid
+                    gpio (str): gpio (GPIOX)
+                    on (bool): new gpio level
+                },
+                ...
+            ]
+
+        """
+        with self.__lock:
+            return list(self.__transitions)
+
+    def clear_transitions(self):
+        """
+        Clear recorded pin transitions
+        """
+        with self.__lock:
+            self.__transitions.clear()
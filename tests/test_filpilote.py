@@ -11,7 +11,7 @@ from cleep.exception import (
     CommandError,
 )
 from cleep.libs.tests import session
-from mock import Mock, patch
+from mock import Mock, patch, call, ANY
 
 
 class TestFilpilote(unittest.TestCase):
@@ -122,6 +122,111 @@ class TestFilpilote(unittest.TestCase):
 
         self.module.set_mode.assert_not_called()
 
+    def test_on_render_unknown_mode_is_rejected(self):
+        self.init()
+        self.module._get_device = Mock(return_value={"uuid": "123-456-789"})
+        self.module.set_mode = Mock()
+
+        self.module.on_render(
+            "ThermostatProfile", {"device_uuid": "123-456-789", "mode": "dummy"}
+        )
+
+        self.module.set_mode.assert_not_called()
+        self.assertEqual(self.module.get_render_stats()["rejected"], 1)
+
+    def test_on_render_unknown_profile_is_rejected(self):
+        self.init()
+        self.module._get_device = Mock(return_value={"uuid": "123-456-789"})
+        self.module.set_mode = Mock()
+
+        self.module.on_render("DummyProfile", self.THERMOSTAT_EVENT_ECO)
+
+        self.module.set_mode.assert_not_called()
+        self.module._get_device.assert_not_called()
+        self.assertDictEqual(
+            self.module.get_render_stats(), {"rendered": 0, "rejected": 1}
+        )
+
+    def test_on_render_batch(self):
+        self.init()
+        self.module._get_device = Mock(
+            side_effect=[{"uuid": "123-456-789"}, None, {"uuid": "987-654-321"}]
+        )
+        self.module.set_mode = Mock()
+
+        self.module.on_render(
+            "ThermostatProfile",
+            [
+                self.THERMOSTAT_EVENT_ECO,
+                self.THERMOSTAT_EVENT_STOP,
+                {"device_uuid": "987-654-321", "mode": "comfort1"},
+            ],
+        )
+
+        self.assertEqual(self.module.set_mode.call_count, 2)
+        self.module.set_mode.assert_any_call("123-456-789", Filpilote.MODE_ECO)
+        self.module.set_mode.assert_any_call("987-654-321", Filpilote.MODE_COMFORT)
+
+    def test_on_render_area_mapping_override(self):
+        self.init()
+        self.module._get_device = Mock(
+            return_value={
+                "uuid": "123-456-789",
+                "render_mappings": {"ThermostatProfile": {"eco": Filpilote.MODE_STOP}},
+            }
+        )
+        self.module.set_mode = Mock()
+
+        self.module.on_render("ThermostatProfile", self.THERMOSTAT_EVENT_ECO)
+        self.module.set_mode.assert_called_with("123-456-789", Filpilote.MODE_STOP)
+
+        self.module.on_render("ThermostatProfile", self.THERMOSTAT_EVENT_ANTIFROST)
+        self.module.set_mode.assert_called_with("123-456-789", Filpilote.MODE_ANTIFROST)
+
+    def test_set_render_mapping(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+
+        response = self.module.set_render_mapping(
+            area["uuid"], "ThermostatProfile", {"eco": Filpilote.MODE_ANTIFROST}
+        )
+
+        self.assertTrue(response)
+        device = self.module._get_device(area["uuid"])
+        self.assertDictEqual(
+            device["render_mappings"],
+            {"ThermostatProfile": {"eco": Filpilote.MODE_ANTIFROST}},
+        )
+
+        self.module.set_render_mapping(area["uuid"], "ThermostatProfile", {})
+
+        device = self.module._get_device(area["uuid"])
+        self.assertDictEqual(device["render_mappings"], {})
+
+    def test_set_render_mapping_invalid_params(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_render_mapping("an.uuid", "ThermostatProfile", {})
+        self.assertEqual(cm.exception.message, "Specified area does not exist")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_render_mapping(area["uuid"], "DummyProfile", {})
+        self.assertEqual(cm.exception.message, "Specified profile is not supported")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_render_mapping(
+                area["uuid"], "ThermostatProfile", {"eco": "amode"}
+            )
+        self.assertEqual(cm.exception.message, "Mapping contains invalid mode")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_render_mapping(
+                area["uuid"], "ThermostatProfile", {"ecco": Filpilote.MODE_STOP}
+            )
+        self.assertEqual(cm.exception.message, "Mapping contains unknown profile value")
+
     def test_add_area(self):
         self.init()
         self.module._add_device = Mock()
@@ -367,6 +472,511 @@ class TestFilpilote(unittest.TestCase):
         device = self.module._get_device(area["uuid"])
         self.assertEqual(device["mode"], area["mode"])
 
+    def test_set_simulation_routes_commands_to_virtual_pin_bank(self):
+        self.init()
+
+        self.assertTrue(self.module.set_simulation(True))
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+
+        self.session.assert_command_not_called("add_gpio")
+        self.session.assert_command_not_called("turn_on")
+        transitions = self.module.get_simulation_transitions()
+        self.assertListEqual(
+            [(transition["gpio"], transition["on"]) for transition in transitions],
+            [("GPIO1", True), ("GPIO2", True)],
+        )
+        self.assertTrue(self.module._get_config_field("simulation")["enabled"])
+
+    def test_set_simulation_fault_restores_previous_mode(self):
+        self.init()
+        self.module.set_simulation(True)
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_simulation(True, fault_rate=1.0)
+
+        response = self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+
+        self.assertFalse(response)
+        device = self.module._get_device(area["uuid"])
+        self.assertEqual(device["mode"], area["mode"])
+
+        # same sequence without fault succeeds: failure above comes from fault injection
+        self.module.set_simulation(True, fault_rate=0.0)
+
+        response = self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+
+        self.assertTrue(response)
+        device = self.module._get_device(area["uuid"])
+        self.assertEqual(device["mode"], self.module.MODE_ECO)
+
+    def test_set_simulation_keeps_virtual_gpios_on_parameters_change(self):
+        self.init()
+        self.module.set_simulation(True)
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+
+        self.module.set_simulation(True, latency=0.0, jitter=0.0, time_scale=5.0)
+
+        self.assertTrue(self.module.set_mode(area["uuid"], self.module.MODE_COMFORT))
+        self.assertEqual(len(self.module.get_simulation_transitions()), 4)
+
+    def test_configure_restores_areas_gpios_in_simulation(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module._set_config_field(
+            "simulation",
+            {
+                "enabled": True,
+                "latency": 0.0,
+                "jitter": 0.0,
+                "faultrate": 0.0,
+                "timescale": 1.0,
+            },
+        )
+
+        # simulate application restart
+        self.module._configure()
+
+        self.assertTrue(self.module.set_mode(area["uuid"], self.module.MODE_ECO))
+        self.session.assert_command_not_called("turn_on")
+        transitions = self.module.get_simulation_transitions()
+        self.assertListEqual(
+            [transition["uuid"] for transition in transitions],
+            [self.GPIO1["uuid"], self.GPIO2["uuid"]],
+        )
+
+    def test_disable_simulation_deletes_simulated_areas(self):
+        self.init()
+        real_area = self.module.add_area("groundfloor", "GPIO1", "GPIO2")
+        self.module.set_simulation(True)
+        simulated_area = self.module.add_area("firstfloor", "GPIO3", "GPIO4")
+        self.assertTrue(self.module._get_device(simulated_area["uuid"])["simulated"])
+
+        self.module.set_simulation(False)
+
+        self.assertIsNone(self.module._get_device(simulated_area["uuid"]))
+        self.assertIsNotNone(self.module._get_device(real_area["uuid"]))
+        self.assertNotIn("simulated", self.module._get_device(real_area["uuid"]))
+
+    def test_set_simulation_invalid_params(self):
+        self.init()
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_simulation(True, latency=-1.0)
+        self.assertEqual(cm.exception.message, "Latency must be positive")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_simulation(True, fault_rate=2.0)
+        self.assertEqual(cm.exception.message, "Fault rate must be between 0 and 1")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_simulation(True, time_scale=0.0)
+        self.assertEqual(cm.exception.message, "Time scale must be greater than 0")
+
+    def test_get_simulation_transitions_simulation_disabled(self):
+        self.init()
+
+        with self.assertRaises(CommandError) as cm:
+            self.module.get_simulation_transitions()
+        self.assertEqual(cm.exception.message, "Hardware simulation is not enabled")
+
+    @patch("backend.filpilote.Task")
+    def test_on_start_starts_refresh_task(self, task_mock):
+        self.init(start=False)
+        self.module._set_config_field("refreshinterval", 60)
+
+        self.session.start_module(self.module)
+
+        task_mock.assert_any_call(Filpilote.REFRESH_TICK, ANY, ANY, task_args=[60])
+        task_mock.return_value.start.assert_called()
+
+    @patch("backend.filpilote.Task")
+    def test_on_start_refresh_disabled(self, task_mock):
+        self.init()
+
+        self.assertNotIn(
+            call(Filpilote.REFRESH_TICK, ANY, ANY, task_args=ANY),
+            task_mock.call_args_list,
+        )
+
+    @patch("backend.filpilote.Task")
+    def test_set_refresh_interval(self, task_mock):
+        self.init()
+        task_mock.reset_mock()
+
+        self.assertTrue(self.module.set_refresh_interval(60))
+        self.assertEqual(self.module._get_config_field("refreshinterval"), 60)
+        task_mock.return_value.start.assert_called()
+
+        self.module.set_refresh_interval(0)
+        task_mock.return_value.stop.assert_called()
+        self.assertEqual(task_mock.call_count, 1)
+
+    def test_set_refresh_interval_invalid_params(self):
+        self.init()
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_refresh_interval(1)
+        self.assertEqual(
+            cm.exception.message, "Refresh interval must be 0 or at least 10 seconds"
+        )
+
+    def test_refresh_areas_is_staggered(self):
+        self.init()
+        areas = {
+            uuid: {"uuid": uuid, "name": uuid, "mode": Filpilote.MODE_ECO}
+            for uuid in ["a", "b", "c", "d"]
+        }
+        self.module._get_devices = Mock(return_value=areas)
+        self.module._get_device = Mock(side_effect=areas.get)
+        self.module._Filpilote__apply_mode = Mock()
+
+        # 4 areas refreshed every 20 seconds with a 10 seconds tick: 2 areas per tick
+        self.module._Filpilote__refresh_areas(20)
+        self.module._Filpilote__apply_mode.assert_has_calls(
+            [call(Filpilote.MODE_ECO, areas["a"]), call(Filpilote.MODE_ECO, areas["b"])]
+        )
+        self.assertEqual(self.module._Filpilote__apply_mode.call_count, 2)
+
+        self.module._Filpilote__refresh_areas(20)
+        self.module._Filpilote__apply_mode.assert_has_calls(
+            [call(Filpilote.MODE_ECO, areas["c"]), call(Filpilote.MODE_ECO, areas["d"])]
+        )
+        self.assertEqual(self.module._Filpilote__apply_mode.call_count, 4)
+
+    def test_refresh_areas_skips_recently_applied_area(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+        self.module._Filpilote__apply_mode = Mock()
+
+        self.module._Filpilote__refresh_areas(Filpilote.REFRESH_TICK)
+
+        self.module._Filpilote__apply_mode.assert_not_called()
+
+    def test_on_start_starts_thermal_tasks(self):
+        with patch("backend.filpilote.Task") as task_mock:
+            self.init()
+
+        task_mock.assert_any_call(Filpilote.THERMAL_FIT_INTERVAL, ANY, ANY)
+        task_mock.assert_any_call(Filpilote.PREHEAT_TICK, ANY, ANY)
+
+    def test_set_area_sensor(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+
+        self.assertTrue(self.module.set_area_sensor(area["uuid"], "sensor-uuid"))
+
+        device = self.module._get_device(area["uuid"])
+        self.assertEqual(device["sensor_uuid"], "sensor-uuid")
+
+    def test_set_area_sensor_invalid_params(self):
+        self.init()
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_area_sensor("an.uuid", "sensor-uuid")
+        self.assertEqual(cm.exception.message, "Specified area does not exist")
+
+    def test_temperature_samples_fit_thermal_models(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_area_sensor(area["uuid"], "sensor-uuid")
+        self.module.set_mode(area["uuid"], self.module.MODE_COMFORT)
+        for index in range(4):
+            self.module.on_event(
+                {
+                    "event": "sensors.temperature.update",
+                    "device_id": "sensor-uuid",
+                    "params": {"timestamp": index * 1800, "celsius": 16.0 + index},
+                }
+            )
+        self.module.on_event(
+            {
+                "event": "sensors.temperature.update",
+                "device_id": "other-sensor",
+                "params": {"timestamp": 7200, "celsius": 30.0},
+            }
+        )
+
+        self.module._Filpilote__fit_thermal_models()
+
+        models = self.module.get_thermal_models()
+        self.assertAlmostEqual(models[area["uuid"]]["heatrate"], 2.0)
+        self.assertIsNone(models[area["uuid"]]["coolrate"])
+        self.assertAlmostEqual(models[area["uuid"]]["error"], 0.0)
+        self.assertIn("fitduration", models[area["uuid"]])
+
+    def test_set_preheat(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+
+        with patch("backend.filpilote.time.time", return_value=1000):
+            self.assertTrue(self.module.set_preheat(area["uuid"], 5000, 20.0))
+
+        device = self.module._get_device(area["uuid"])
+        self.assertDictEqual(device["preheat"], {"time": 5000, "temperature": 20.0})
+
+    def test_set_preheat_invalid_params(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+
+        with self.assertRaises(InvalidParameter) as cm:
+            self.module.set_preheat("an.uuid", 5000, 20.0)
+        self.assertEqual(cm.exception.message, "Specified area does not exist")
+
+        with patch("backend.filpilote.time.time", return_value=10000):
+            with self.assertRaises(InvalidParameter) as cm:
+                self.module.set_preheat(area["uuid"], 5000, 20.0)
+        self.assertEqual(cm.exception.message, "Comfort time must be in the future")
+
+    def test_check_preheats_switches_comfort_early(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_area_sensor(area["uuid"], "sensor-uuid")
+        self.module._update_device(
+            area["uuid"], {"preheat": {"time": 10000, "temperature": 20.0}}
+        )
+        self.module._Filpilote__thermal_models = {
+            area["uuid"]: {"heatrate": 2.0, "coolrate": -1.0, "error": 0.1}
+        }
+        self.module.on_event(
+            {
+                "event": "sensors.temperature.update",
+                "device_id": "sensor-uuid",
+                "params": {"timestamp": 5900, "celsius": 18.0},
+            }
+        )
+        self.module.set_mode = Mock()
+
+        # 2 celsius to gain at 2 celsius per hour: preheat starts at 6400
+        with patch("backend.filpilote.time.time", return_value=6000):
+            self.module._Filpilote__check_preheats()
+        self.module.set_mode.assert_not_called()
+
+        with patch("backend.filpilote.time.time", return_value=6400):
+            self.module._Filpilote__check_preheats()
+        self.module.set_mode.assert_called_with(area["uuid"], Filpilote.MODE_COMFORT)
+        self.assertIsNone(self.module._get_device(area["uuid"])["preheat"])
+
+    def test_check_preheats_without_model_switches_at_comfort_time(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module._update_device(
+            area["uuid"], {"preheat": {"time": 10000, "temperature": 20.0}}
+        )
+        self.module.set_mode = Mock()
+
+        with patch("backend.filpilote.time.time", return_value=9999):
+            self.module._Filpilote__check_preheats()
+        self.module.set_mode.assert_not_called()
+
+        with patch("backend.filpilote.time.time", return_value=10000):
+            self.module._Filpilote__check_preheats()
+        self.module.set_mode.assert_called_with(area["uuid"], Filpilote.MODE_COMFORT)
+
+    def run_refresh_ticks(self, area_uuids, refresh_interval, ticks):
+        areas = {
+            uuid: {
+                "uuid": uuid,
+                "name": uuid,
+                "mode": Filpilote.MODE_ECO,
+                "gpio1": {"uuid": f"{uuid}-gpio1"},
+                "gpio2": {"uuid": f"{uuid}-gpio2"},
+            }
+            for uuid in area_uuids
+        }
+        self.module._get_devices = Mock(return_value=areas)
+        self.module._get_device = Mock(side_effect=areas.get)
+        refreshes = []
+        now = [1000.0]
+
+        def send_gpios_command(command, params):
+            if params["device_uuid"].endswith("gpio1"):
+                refreshes.append((now[0], params["device_uuid"][:-6]))
+            return Mock(error=False)
+
+        self.module._Filpilote__send_gpios_command = Mock(
+            side_effect=send_gpios_command
+        )
+
+        with patch("backend.filpilote.time.monotonic", side_effect=lambda: now[0]):
+            for _ in range(ticks):
+                self.module._Filpilote__refresh_areas(refresh_interval)
+                now[0] += Filpilote.REFRESH_TICK
+
+        return refreshes
+
+    def test_refresh_areas_period_over_several_cycles(self):
+        self.init()
+
+        # 5 areas, 60 seconds interval, 10 seconds tick: 5 refreshes every 6 ticks
+        refreshes = self.run_refresh_ticks(["a", "b", "c", "d", "e"], 60, 16)
+
+        area_refreshes = [timestamp for timestamp, uuid in refreshes if uuid == "a"]
+        self.assertListEqual(area_refreshes, [1010.0, 1070.0, 1130.0])
+        self.assertEqual(len(refreshes), 13)
+        # never more than one area refreshed per tick
+        timestamps = [timestamp for timestamp, _ in refreshes]
+        self.assertEqual(len(timestamps), len(set(timestamps)))
+
+    def test_refresh_areas_single_area_once_per_interval(self):
+        self.init()
+
+        # 2 hours of ticks
+        refreshes = self.run_refresh_ticks(["a"], 3600, 720)
+
+        self.assertListEqual(refreshes, [(4590.0, "a"), (8190.0, "a")])
+
+    def test_refresh_area_applies_mode_set_meanwhile(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+        # snapshot taken before mode changes
+        self.module._get_devices = Mock(
+            return_value={area["uuid"]: self.module._get_device(area["uuid"])}
+        )
+        self.module.set_mode(area["uuid"], self.module.MODE_COMFORT)
+        self.module._Filpilote__last_applies.clear()
+        self.module._Filpilote__apply_mode = Mock()
+
+        self.module._Filpilote__refresh_areas(Filpilote.REFRESH_TICK)
+
+        self.module._Filpilote__apply_mode.assert_called_once_with(
+            self.module.MODE_COMFORT, ANY
+        )
+
+    def test_fit_thermal_models_saves_models_restored_after_restart(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_area_sensor(area["uuid"], "sensor-uuid")
+        self.module.set_mode(area["uuid"], self.module.MODE_COMFORT)
+        for index in range(2):
+            self.module.on_event(
+                {
+                    "event": "sensors.temperature.update",
+                    "device_id": "sensor-uuid",
+                    "params": {"timestamp": index * 3600, "celsius": 16.0 + index},
+                }
+            )
+        self.module._Filpilote__fit_thermal_models()
+        self.assertAlmostEqual(
+            self.module._get_device(area["uuid"])["thermal_model"]["heatrate"], 1.0
+        )
+
+        # simulate application restart
+        self.module._Filpilote__thermal_models = {}
+        self.module._configure()
+
+        models = self.module.get_thermal_models()
+        self.assertAlmostEqual(models[area["uuid"]]["heatrate"], 1.0)
+
+    def test_fit_thermal_models_keeps_previous_model_without_enough_samples(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        model = {"heatrate": 2.0, "coolrate": -1.0, "error": 0.1}
+        self.module._Filpilote__thermal_models = {area["uuid"]: model}
+        self.module.set_area_sensor(area["uuid"], "sensor-uuid")
+        self.module.on_event(
+            {
+                "event": "sensors.temperature.update",
+                "device_id": "sensor-uuid",
+                "params": {"timestamp": 1000, "celsius": 18.0},
+            }
+        )
+
+        self.module._Filpilote__fit_thermal_models()
+
+        self.assertDictEqual(self.module.get_thermal_models()[area["uuid"]], model)
+
+    def test_check_preheats_accounts_cooling_in_eco_mode(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_area_sensor(area["uuid"], "sensor-uuid")
+        self.module.set_mode(area["uuid"], self.module.MODE_ECO)
+        self.module._update_device(
+            area["uuid"], {"preheat": {"time": 30000, "temperature": 20.0}}
+        )
+        self.module._Filpilote__thermal_models = {
+            area["uuid"]: {"heatrate": 2.0, "coolrate": -1.0, "error": 0.1}
+        }
+        self.module.on_event(
+            {
+                "event": "sensors.temperature.update",
+                "device_id": "sensor-uuid",
+                "params": {"timestamp": 11900, "celsius": 20.0},
+            }
+        )
+        preheat = {"time": 30000, "temperature": 20.0}
+        get_preheat_duration = self.module._Filpilote__get_preheat_duration
+
+        # cools 5 celsius in 5 hours: heating must start 6000 seconds before comfort time
+        area = self.module._get_device(area["uuid"])
+        self.assertAlmostEqual(get_preheat_duration(area, preheat, 12000), 6000.0)
+
+        # area not cooling
+        area = dict(area, mode=Filpilote.MODE_STOP)
+        self.assertEqual(get_preheat_duration(area, preheat, 12000), 0.0)
+
+    def test_check_preheats_ignores_old_temperature(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module.set_area_sensor(area["uuid"], "sensor-uuid")
+        self.module._update_device(
+            area["uuid"], {"preheat": {"time": 10000, "temperature": 20.0}}
+        )
+        self.module._Filpilote__thermal_models = {
+            area["uuid"]: {"heatrate": 2.0, "coolrate": -1.0, "error": 0.1}
+        }
+        self.module.on_event(
+            {
+                "event": "sensors.temperature.update",
+                "device_id": "sensor-uuid",
+                "params": {"timestamp": 1000, "celsius": 18.0},
+            }
+        )
+        self.module.set_mode = Mock()
+
+        # sample is too old to predict preheat: switch at comfort time
+        with patch("backend.filpilote.time.time", return_value=6400):
+            self.module._Filpilote__check_preheats()
+        self.module.set_mode.assert_not_called()
+
+        with patch("backend.filpilote.time.time", return_value=10000):
+            self.module._Filpilote__check_preheats()
+        self.module.set_mode.assert_called_with(area["uuid"], Filpilote.MODE_COMFORT)
+
+    def test_check_preheats_drops_expired_preheat(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module._update_device(
+            area["uuid"], {"preheat": {"time": 10000, "temperature": 20.0}}
+        )
+        self.module.set_mode = Mock()
+
+        with patch("backend.filpilote.time.time", return_value=20000):
+            self.module._Filpilote__check_preheats()
+
+        self.module.set_mode.assert_not_called()
+        self.assertIsNone(self.module._get_device(area["uuid"])["preheat"])
+
+    def test_check_preheats_uses_preheat_cancelled_meanwhile(self):
+        self.init()
+        area = self.module.add_area("firstfloor", "GPIO1", "GPIO2")
+        self.module._update_device(
+            area["uuid"], {"preheat": {"time": 10000, "temperature": 20.0}}
+        )
+        # snapshot taken before preheat is cancelled
+        self.module._get_devices = Mock(
+            return_value={area["uuid"]: dict(self.module._get_device(area["uuid"]))}
+        )
+        self.module._update_device(area["uuid"], {"preheat": None})
+        self.module.set_mode = Mock()
+
+        with patch("backend.filpilote.time.time", return_value=10000):
+            self.module._Filpilote__check_preheats()
+
+        self.module.set_mode.assert_not_called()
+
 
 # do not remove code below, otherwise tests won't run
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import unittest
+import logging
+import sys
+
+sys.path.append("../")
+from backend.thermalmodel import (
+    fit_thermal_models,
+    fit_thermal_model,
+    get_preheat_duration,
+)
+
+
+class TestThermalModel(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(
+            level=logging.FATAL,
+            format="%(asctime)s %(name)s:%(lineno)d %(levelname)s : %(message)s",
+        )
+
+    def test_fit_thermal_model(self):
+        samples = [
+            (0, 16.0, "COMFORT"),
+            (1800, 17.0, "COMFORT"),
+            (3600, 18.0, "COMFORT"),
+            (5400, 18.0, "ECO"),
+            (9000, 17.0, "ECO"),
+            (12600, 16.0, "ECO"),
+        ]
+
+        model = fit_thermal_model(samples, "COMFORT", "ECO")
+
+        self.assertAlmostEqual(model["heatrate"], 2.0)
+        self.assertAlmostEqual(model["coolrate"], -1.0)
+        self.assertAlmostEqual(model["error"], 0.0)
+
+    def test_fit_thermal_model_pools_segments(self):
+        samples = [
+            (0, 16.0, "COMFORT"),
+            (3600, 18.0, "COMFORT"),
+            (7200, 18.0, "ECO"),
+            (10800, 20.0, "COMFORT"),
+            (14400, 24.0, "COMFORT"),
+        ]
+
+        model = fit_thermal_model(samples, "COMFORT", "ECO")
+
+        # 2 and 4 celsius per hour segments, each predicted 1 celsius off at 1 hour
+        self.assertAlmostEqual(model["heatrate"], 3.0)
+        self.assertIsNone(model["coolrate"])
+        self.assertAlmostEqual(model["error"], 1.0)
+
+    def test_fit_thermal_model_not_enough_samples(self):
+        samples = [
+            (0, 16.0, "COMFORT"),
+            (3600, 18.0, "STOP"),
+            (7200, 18.0, "ECO"),
+        ]
+
+        model = fit_thermal_model(samples, "COMFORT", "ECO")
+
+        self.assertDictEqual(model, {"heatrate": None, "coolrate": None, "error": None})
+
+    def test_fit_thermal_models(self):
+        samples = {
+            "area1": [(0, 16.0, "COMFORT"), (3600, 18.0, "COMFORT")],
+            "area2": [(0, 18.0, "ECO"), (3600, 17.0, "ECO")],
+        }
+
+        models = fit_thermal_models(samples, "COMFORT", "ECO")
+
+        self.assertAlmostEqual(models["area1"]["heatrate"], 2.0)
+        self.assertAlmostEqual(models["area2"]["coolrate"], -1.0)
+        for model in models.values():
+            self.assertGreaterEqual(model["fitduration"], 0)
+            self.assertGreater(model["fittime"], 0)
+
+    def test_fit_thermal_model_error_is_prediction_error(self):
+        # heating slows down: each segment is linear but not from its first sample
+        samples = [
+            (0, 16.0, "COMFORT"),
+            (1800, 18.0, "COMFORT"),
+            (3600, 19.0, "COMFORT"),
+        ]
+
+        model = fit_thermal_model(samples, "COMFORT", "ECO")
+
+        self.assertAlmostEqual(model["heatrate"], 3.0)
+        # predicted 17.5 and 19.0 from 16.0 at 0
+        self.assertAlmostEqual(model["error"], (0.5**2 / 2) ** 0.5)
+
+    def test_get_preheat_duration_while_cooling(self):
+        model = {"heatrate": 2.0, "coolrate": -1.0, "error": 0.0}
+
+        # cools 1 celsius per hour until heating starts 1h40 before target time
+        duration = get_preheat_duration(model, 20.0, 20.0, 5 * 3600)
+        self.assertAlmostEqual(duration, 6000.0)
+
+        # target too close: heating starts now
+        duration = get_preheat_duration(model, 18.0, 20.0, 1800)
+        self.assertAlmostEqual(duration, 3600.0)
+
+        # coolrate is ignored when area is not cooling
+        self.assertEqual(get_preheat_duration(model, 20.0, 20.0), 0.0)
+
+    def test_get_preheat_duration(self):
+        model = {"heatrate": 2.0, "coolrate": -1.0, "error": 0.0}
+
+        self.assertAlmostEqual(get_preheat_duration(model, 18.0, 20.0), 3600.0)
+        self.assertEqual(get_preheat_duration(model, 21.0, 20.0), 0.0)
+        self.assertIsNone(get_preheat_duration(None, 18.0, 20.0))
+        self.assertIsNone(get_preheat_duration({"heatrate": -1.0}, 18.0, 20.0))
+
+
+# do not remove code below, otherwise tests won't run
+if __name__ == "__main__":
+    unittest.main()
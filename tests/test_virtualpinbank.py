@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import unittest
+import logging
+import random
+import sys
+
+sys.path.append("../")
+from backend.virtualpinbank import VirtualPinBank
+from mock import Mock
+
+
+class TestVirtualPinBank(unittest.TestCase):
+    GPIO_PARAMS = {
+        "name": "filpilote_firstfloor_gpio1",
+        "gpio": "GPIO1",
+        "mode": "output",
+        "keep": True,
+        "inverted": False,
+    }
+
+    def setUp(self):
+        logging.basicConfig(
+            level=logging.FATAL,
+            format="%(asctime)s %(name)s:%(lineno)d %(levelname)s : %(message)s",
+        )
+        self.clock = Mock(side_effect=[0.0, 1.0, 2.0, 3.0])
+        self.sleep = Mock()
+
+    def init(self, **kwargs):
+        self.bank = VirtualPinBank(
+            rand=random.Random(0), clock=self.clock, sleep=self.sleep, **kwargs
+        )
+
+    def test_add_gpio(self):
+        self.init()
+
+        resp = self.bank.execute("add_gpio", self.GPIO_PARAMS)
+
+        self.assertFalse(resp.error)
+        self.assertEqual(resp.data["gpio"], "GPIO1")
+        self.assertFalse(resp.data["on"])
+        self.assertIn(resp.data["uuid"], self.bank.get_pins())
+
+    def test_add_gpio_already_used(self):
+        self.init()
+        self.bank.execute("add_gpio", self.GPIO_PARAMS)
+
+        resp = self.bank.execute("add_gpio", self.GPIO_PARAMS)
+
+        self.assertTrue(resp.error)
+        self.assertEqual(resp.message, "Gpio GPIO1 is already used")
+
+    def test_delete_gpio(self):
+        self.init()
+        gpio = self.bank.execute("add_gpio", self.GPIO_PARAMS).data
+
+        resp = self.bank.execute("delete_gpio", {"device_uuid": gpio["uuid"]})
+
+        self.assertFalse(resp.error)
+        self.assertDictEqual(self.bank.get_pins(), {})
+
+    def test_turn_on_off_records_transitions(self):
+        self.init()
+        gpio = self.bank.execute("add_gpio", self.GPIO_PARAMS).data
+
+        self.bank.execute("turn_on", {"device_uuid": gpio["uuid"]})
+        self.bank.execute("turn_off", {"device_uuid": gpio["uuid"]})
+
+        self.assertListEqual(
+            self.bank.get_transitions(),
+            [
+                {
+                    "timestamp": 1.0,
+                    "clocktime": 1.0,
+                    "uuid": gpio["uuid"],
+                    "gpio": "GPIO1",
+                    "on": True,
+                },
+                {
+                    "timestamp": 2.0,
+                    "clocktime": 2.0,
+                    "uuid": gpio["uuid"],
+                    "gpio": "GPIO1",
+                    "on": False,
+                },
+            ],
+        )
+        self.bank.clear_transitions()
+        self.assertListEqual(self.bank.get_transitions(), [])
+
+    def test_unchanged_level_is_not_recorded(self):
+        self.init()
+        gpio = self.bank.execute("add_gpio", self.GPIO_PARAMS).data
+
+        self.bank.execute("turn_off", {"device_uuid": gpio["uuid"]})
+        self.bank.execute("turn_on", {"device_uuid": gpio["uuid"]})
+        resp = self.bank.execute("turn_on", {"device_uuid": gpio["uuid"]})
+
+        self.assertFalse(resp.error)
+        self.assertListEqual(
+            [transition["on"] for transition in self.bank.get_transitions()], [True]
+        )
+
+    def test_transitions_use_simulated_time(self):
+        self.init(time_scale=10.0, start_time=100.0)
+        gpio = self.bank.execute("add_gpio", self.GPIO_PARAMS).data
+
+        self.bank.execute("turn_on", {"device_uuid": gpio["uuid"]})
+
+        transition = self.bank.get_transitions()[0]
+        self.assertEqual(transition["timestamp"], 110.0)
+        self.assertEqual(transition["clocktime"], 1.0)
+
+    def test_configure_keeps_gpios_and_rebases_simulated_time(self):
+        self.init(time_scale=10.0)
+        gpio = self.bank.execute("add_gpio", self.GPIO_PARAMS).data
+
+        # simulated time is 10.0 when time scale changes at clock 1.0
+        self.bank.configure(1.0, 0.5, 0.0, 2.0)
+        self.bank.execute("turn_on", {"device_uuid": gpio["uuid"]})
+
+        self.assertIn(gpio["uuid"], self.bank.get_pins())
+        self.assertEqual(self.bank.latency, 1.0)
+        self.assertEqual(self.bank.jitter, 0.5)
+        self.assertEqual(self.bank.time_scale, 2.0)
+        self.assertEqual(self.bank.get_transitions()[0]["timestamp"], 12.0)
+
+    def test_restore_gpio(self):
+        self.init()
+        gpio = {"uuid": "a-uuid", "name": "gpio1", "gpio": "GPIO1", "mode": "output"}
+
+        self.bank.restore_gpio(gpio)
+        resp = self.bank.execute("turn_on", {"device_uuid": "a-uuid"})
+
+        self.assertFalse(resp.error)
+        self.assertTrue(self.bank.get_pins()["a-uuid"]["on"])
+
+    def test_turn_on_unknown_gpio(self):
+        self.init()
+
+        resp = self.bank.execute("turn_on", {"device_uuid": "a-uuid"})
+
+        self.assertTrue(resp.error)
+        self.assertListEqual(self.bank.get_transitions(), [])
+
+    def test_unknown_command(self):
+        self.init()
+
+        resp = self.bank.execute("dummy", {})
+
+        self.assertTrue(resp.error)
+        self.assertEqual(resp.message, 'Unknown command "dummy"')
+
+    def test_latency_and_jitter_with_time_scale(self):
+        self.init(latency=1.0, jitter=0.5, time_scale=10.0)
+
+        self.bank.execute("add_gpio", self.GPIO_PARAMS)
+
+        delay = self.sleep.call_args[0][0]
+        self.assertGreaterEqual(delay, 0.1)
+        self.assertLessEqual(delay, 0.15)
+
+    def test_no_latency(self):
+        self.init()
+
+        self.bank.execute("add_gpio", self.GPIO_PARAMS)
+
+        self.sleep.assert_not_called()
+
+    def test_fault_injection(self):
+        self.init(fault_rate=1.0)
+
+        resp = self.bank.execute("add_gpio", self.GPIO_PARAMS)
+
+        self.assertTrue(resp.error)
+        self.assertEqual(resp.message, 'Simulated fault on "add_gpio" command')
+        self.assertDictEqual(self.bank.get_pins(), {})
+
+
+# do not remove code below, otherwise tests won't run
+if __name__ == "__main__":
+    unittest.main()